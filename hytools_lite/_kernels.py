@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools-lite
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Compute kernels, numba accelerated when numba is installed
+"""
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA = True
+except ImportError:
+    NUMBA = False
+
+
+if NUMBA:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _ndi_numba(band1,band2,out):
+        for i in prange(band1.size):
+            # Widen before subtracting, unsigned differences wrap around
+            value1 = np.float64(band1[i])
+            value2 = np.float64(band2[i])
+            total = value1 + value2
+            if total != 0:
+                out[i] = (value1 - value2)/total
+            else:
+                out[i] = 0
+
+    @njit(parallel=True, cache=True)
+    def _ndi_int_numba(band1,band2,out,scale,low,high):
+        for i in prange(band1.size):
+            total = np.int64(band1[i]) + np.int64(band2[i])
+            if total != 0:
+                value = ((np.int64(band1[i]) - np.int64(band2[i]))*scale)//total
+                out[i] = min(max(value,low),high)
+            else:
+                out[i] = 0
+
+
+def ndi_kernel(band1,band2,out):
+    """Calculate normalized difference of two bands in a single pass.
+    Pixels where the sum of the bands is zero are set to zero.
+
+    Args:
+        band1 (numpy.ndarray): First band array.
+        band2 (numpy.ndarray): Second band array, same shape as band1.
+        out (numpy.ndarray): Preallocated contiguous output array, same shape as band1.
+
+    Returns:
+        numpy.ndarray: Normalized difference array (out).
+
+    """
+
+    # numba only supports native byte order arrays
+    if NUMBA and band1.dtype.isnative and band2.dtype.isnative:
+        _ndi_numba(band1.reshape(-1),band2.reshape(-1),out.reshape(-1))
+    else:
+        total = np.add(band1,band2,dtype=out.dtype)
+        np.subtract(band1,band2,out=out,dtype=out.dtype)
+        np.divide(out,total,out=out,where=total != 0)
+        out[total == 0] = 0
+    return out
+
+
+def ndi_int_kernel(band1,band2,out,scale):
+    """Calculate normalized difference of two integer bands in a single
+    pass using integer math, scaled to +/- scale. Pixels where the sum of
+    the bands is zero are set to zero, values outside the range of the
+    output dtype, possible with signed data, are clipped.
+
+    Args:
+        band1 (numpy.ndarray): First integer band array.
+        band2 (numpy.ndarray): Second integer band array, same shape as band1.
+        out (numpy.ndarray): Preallocated contiguous integer output array, same shape as band1.
+        scale (int): Scale factor of output, ndi = out/scale.
+
+    Returns:
+        numpy.ndarray: Scaled normalized difference array (out).
+
+    """
+
+    low,high = np.iinfo(out.dtype).min,np.iinfo(out.dtype).max
+    if NUMBA and band1.dtype.isnative and band2.dtype.isnative:
+        _ndi_int_numba(band1.reshape(-1),band2.reshape(-1),out.reshape(-1),
+                       scale,low,high)
+    else:
+        total = np.add(band1,band2,dtype=np.int64)
+        diff = np.subtract(band1,band2,dtype=np.int64)*scale
+        np.floor_divide(diff,total,out=diff,where=total != 0)
+        diff[total == 0] = 0
+        np.clip(diff,low,high,out=out,casting='unsafe')
+    return out
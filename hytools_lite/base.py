@@ -21,20 +21,37 @@ Base
 
 """
 import os
-import sys
+import queue
+import threading
 import warnings
+import weakref
+from contextlib import contextmanager
 import h5py
 import numpy as np
-from .io.envi import envi_read_band,envi_read_pixels
+from .io.envi import envi_read_band,envi_read_bands,envi_read_pixels
 from .io.envi import envi_read_line,envi_read_column,envi_read_chunk
 from .io.envi import open_envi,parse_envi_header,envi_header_from_neon
-from .io.neon import open_neon
+from .io.neon import open_neon,neon_read,neon_read_bands,neon_read_chunk,neon_read_pixels
+from ._kernels import ndi_kernel,ndi_int_kernel
 
 warnings.filterwarnings("ignore")
 
+# HDF5 chunk cache settings used when opening NEON files, number of slots
+# should be a prime number ~100x the number of chunks held in the cache
+HDF_CHUNK_CACHE = 256*1024**2
+HDF_CHUNK_SLOTS = 100003
+
 class HyTools:
     """HyTools file object"""
 
+    __slots__ = ('anc_path','ancillary','bad_bands','bands','base_key',
+                 'base_name','brdf','byte_order','columns','crs','data',
+                 'data_file','dtype','endianness','file_name','file_type','fwhm',
+                 'hdf_obj','interleave','lines','map_info','mask','no_data',
+                 'offset','projection','shape','topo','transform','ulx','uly',
+                 'wavelength_units','_header_cache','_open_count','_wavelengths',
+                 '_wave_cache','_wl_argsort','_wl_sorted','_wl_min','_wl_max')
+
     def __init__(self):
         """Constructor method
         """
@@ -51,6 +68,7 @@ class HyTools:
         self.data = None
         self.dtype = None
         self.endianness = None
+        self.data_file = None
         self.file_name = None
         self.file_type = None
         self.fwhm = []
@@ -64,14 +82,46 @@ class HyTools:
         self.projection = None
         self.shape = None
         self.topo = {'type': None}
+        self.transform = None
         self.ulx = None
         self.uly = None
         self.wavelength_units = None
         self.wavelengths = []
+        self._header_cache = None
+        self._open_count = 0
+
+    @property
+    def wavelengths(self):
+        """numpy.ndarray: Band center wavelengths.
+        """
+        return self._wavelengths
+
+    @wavelengths.setter
+    def wavelengths(self,wavelengths):
+        """Store wavelengths as an array and cache the sorted wavelengths
+        and range used for wavelength to band lookups. Clears cached lookups.
+        """
+        if wavelengths is None:
+            wavelengths = []
+        wavelengths = np.ascontiguousarray(wavelengths)
+        if wavelengths.dtype.kind != 'f':
+            wavelengths = wavelengths.astype(float)
+        self._wavelengths = wavelengths
+        self._wave_cache = {}
+        self._wl_argsort = np.argsort(self._wavelengths,kind='stable')
+        self._wl_sorted = self._wavelengths[self._wl_argsort]
+        if self._wavelengths.size > 0:
+            self._wl_min = self._wl_sorted[0]
+            self._wl_max = self._wl_sorted[-1]
+        else:
+            self._wl_min = None
+            self._wl_max = None
 
     def read_file(self,file_name,file_type = 'envi',anc_path = None, ext = False):
         self.file_name = file_name
+        self.data_file = file_name
         self.file_type = file_type
+        self._header_cache = None
 
         if file_type == 'envi':
             open_envi(self,anc_path,ext)
@@ -85,7 +135,7 @@ class HyTools:
         self.base_name = os.path.basename(os.path.splitext(self.file_name)[0])
 
     def create_bad_bands(self,bad_regions):
-        """Create bad bands mask, Good: True, bad : False.
+        """Create bad bands mask, Bad: True, good : False.
 
         Args:
             bad_regions (list of lists): start and end values of wavelength
@@ -97,47 +147,94 @@ class HyTools:
 
         """
 
-        bad_bands = []
-        for wavelength in self.wavelengths:
-            bad=False
-            for start,end in bad_regions:
-                bad = ((wavelength >= start) & (wavelength <=end)) or bad
-            bad_bands.append(bad)
-        self.bad_bands = np.array(bad_bands)
+        bad_regions = np.asarray(bad_regions,dtype=float).reshape(-1,2)
+        wavelengths = self.wavelengths[:,np.newaxis]
+        self.bad_bands = ((wavelengths >= bad_regions[:,0]) &
+                          (wavelengths <= bad_regions[:,1])).any(axis=1)
 
 
-    def load_data(self, mode = 'r'):
-        """Load data object to memory.
+    def load_data(self, mode = 'r', rdcc_nbytes = None):
+        """Load data object to memory. Calls are reference counted, the
+        data object is only created on the first call and reused by
+        subsequent calls until a matching number of close_data() calls.
+
+        Data is always opened read-only and must not be written through
+        self.data. Read-only memory maps are shared through the page cache,
+        to share physical pages between worker processes load the data in
+        the parent process before forking.
 
         Args:
-            mode (str, optional): File read mode. Defaults to 'r'.
-            offset (int, optional): Offset in bytes. Defaults to 0.
+            mode (str, optional): File read mode, only 'r' is supported. Defaults to 'r'.
+            rdcc_nbytes (int, optional): HDF5 chunk cache size in bytes, NEON only.
+                                         Defaults to 256 MiB clamped to the
+                                         uncompressed image size.
 
         Returns:
             None.
 
         """
 
+        if mode != 'r':
+            print("Data can only be opened read-only, ignoring mode '%s'." % mode)
+
+        if self._open_count > 0:
+            self._open_count += 1
+            return
+
+        # Only count the call once the data object has been opened
         if self.file_type  == "envi":
-            self.data = np.memmap(self.file_name,dtype = self.dtype, mode=mode,
+            # Byte ordered dtype, values are swapped by numpy on access
+            byte_order = '>' if self.endianness == 'big' else '<'
+            dtype = np.dtype(self.dtype).newbyteorder(byte_order)
+            self.data = np.memmap(self.data_file,dtype = dtype, mode='r',
                                   shape = self.shape,offset=self.offset)
         elif self.file_type  == "neon":
-            self.hdf_obj = h5py.File(self.file_name,'r')
-            self.data = self.hdf_obj[self.base_key]["Reflectance"]["Reflectance_Data"]
+            if rdcc_nbytes is None:
+                image_bytes = self.lines*self.columns*self.bands*np.dtype(self.dtype).itemsize
+                rdcc_nbytes = min(HDF_CHUNK_CACHE,image_bytes)
+            self.hdf_obj = h5py.File(self.data_file,'r',rdcc_nbytes=rdcc_nbytes,
+                                     rdcc_nslots=HDF_CHUNK_SLOTS,rdcc_w0=0.75)
+            try:
+                self.data = self.hdf_obj[self.base_key]["Reflectance"]["Reflectance_Data"]
+            except Exception:
+                self.hdf_obj.close()
+                self.hdf_obj = None
+                raise
+        self._open_count = 1
 
     def close_data(self):
-        """Close data object.
+        """Close data object. The data object is only closed once all
+        load_data() calls have been matched.
 
         """
+        if self._open_count == 0:
+            return
+        self._open_count -= 1
+        if self._open_count > 0:
+            return
+
         if self.file_type  == "envi":
+            # Getters return copies, dropping the memory-map releases the
+            # mapping unless views of self.data are held elsewhere
             del self.data
         elif self.file_type  == "neon":
             self.hdf_obj.close()
             self.hdf_obj = None
         self.data = None
 
+    @contextmanager
+    def _data_ctx(self):
+        """Context manager keeping the data object open for the duration
+        of the block.
+        """
+        self.load_data()
+        try:
+            yield self.data
+        finally:
+            self.close_data()
+
 
-    def iterate(self,by,chunk_size= (100,100)):
+    def iterate(self,by,chunk_size= (100,100),prefetch = 0,reuse_buffer = False):
         """Create data Iterator.
 
         Args:
@@ -145,13 +242,18 @@ class HyTools:
             chunk_size (tuple, optional): Two dimensional chunk size (Y,X).
                                           Applies only when "chunk" selected.
                                           Defaults to (100,100).
+            prefetch (int, optional): Number of slices read ahead in a background
+                                      thread. Defaults to 0, no prefetching.
+            reuse_buffer (bool, optional): Read slices into preallocated buffers
+                                           reused across read_next() calls.
+                                           Defaults to False.
 
         Returns:
             Iterator class object: Data Iterator.
 
         """
 
-        return Iterator(self,by,chunk_size)
+        return Iterator(self,by,chunk_size,prefetch,reuse_buffer)
 
     def wave_to_band(self,wave):
         """Return band index corresponding to input wavelength. Return closest band if
@@ -165,32 +267,49 @@ class HyTools:
 
         """
 
-        if (wave  > self.wavelengths.max()) | (wave  < self.wavelengths.min()):
+        # Lookups are cached by wavelength rounded to 1e-6 image units
+        wave_key = round(float(wave),6)
+        band_num = self._wave_cache.get(wave_key)
+        if band_num is not None:
+            return band_num
+
+        if (self._wl_min is None) or (wave  > self._wl_max) or (wave  < self._wl_min):
             print("Input wavelength outside image range!")
-            band_num = None
-        else:
-            band_num = np.argmin(np.abs(self.wavelengths - wave))
+            return None
+
+        # Closest of the two neighbouring wavelengths in the sorted array,
+        # ties resolve to the lowest band index
+        upper = min(np.searchsorted(self._wl_sorted,wave),self._wl_sorted.size-1)
+        band_num = self._wl_argsort[upper]
+        if upper > 0:
+            lower_wave = self._wl_sorted[upper-1]
+            lower = np.searchsorted(self._wl_sorted,lower_wave)
+            lower_dist = wave - lower_wave
+            upper_dist = self._wl_sorted[upper] - wave
+            if (lower_dist < upper_dist) or ((lower_dist == upper_dist) and
+                                             (self._wl_argsort[lower] < band_num)):
+                band_num = self._wl_argsort[lower]
+        self._wave_cache[wave_key] = band_num
         return band_num
 
-    def get_band(self,index, mask =None):
+    def get_band(self,index, mask =None, out = None):
         """
         Args:
             index (int): Zero-indexed band index.
             mask (str): Return masked values using named mask.
+            out (numpy.ndarray, optional): Array (lines,columns) the band is
+                                           read into. Defaults to None.
 
         Returns:
             numpy.ndarray: A 2D (lines x columns) array or 1D if masked.
 
         """
 
-        self.load_data()
-        if self.file_type == "neon":
-            band =  self.data[:,:,index]
-        elif self.file_type == "envi":
-            band = envi_read_band(self.data,index,self.interleave)
-            if self.endianness != sys.byteorder:
-                band = band.byteswap()
-        self.close_data()
+        with self._data_ctx():
+            if self.file_type == "neon":
+                band = neon_read(self.data,np.s_[:,:,index],out)
+            elif self.file_type == "envi":
+                band = envi_read_band(self.data,index,self.interleave,out)
 
         if mask:
             band = band[self.mask[mask]]
@@ -198,6 +317,31 @@ class HyTools:
         return band
 
 
+    def get_bands(self,indices, mask =None, out = None):
+        """
+        Args:
+            indices (list): List of zero-indexed band indices.
+            mask (str): Return masked values using named mask.
+            out (numpy.ndarray, optional): Array (bands,lines,columns) the bands
+                                           are read into. Defaults to None.
+
+        Returns:
+            numpy.ndarray: A 3D (bands x lines x columns) array or 2D
+                           (bands x pixels) if masked.
+
+        """
+
+        with self._data_ctx():
+            if self.file_type == "neon":
+                bands = neon_read_bands(self.data,indices,out)
+            elif self.file_type == "envi":
+                bands = envi_read_bands(self.data,indices,self.interleave,out)
+
+        if mask:
+            bands = bands[:,self.mask[mask]]
+
+        return bands
+
     def get_wave(self,wave,mask =None):
         """Return the band image corresponding to the input wavelength.
         If not an exact match the closest wavelength will be returned.
@@ -212,11 +356,10 @@ class HyTools:
 
         """
 
-        if (wave  > self.wavelengths.max()) | (wave  < self.wavelengths.min()):
-            print("Input wavelength outside wavelength range!")
+        band_num = self.wave_to_band(wave)
+        if band_num is None:
             band = None
         else:
-            band_num = np.argmin(np.abs(self.wavelengths - wave))
             band = self.get_band(band_num, mask=mask)
         return band
 
@@ -231,89 +374,81 @@ class HyTools:
 
         """
 
-        self.load_data()
-        if self.file_type == "neon":
-            pixels = []
-            for line,column in zip(lines,columns):
-                pixels.append(self.data[line,column,:])
-            pixels = np.array(pixels)
-        elif self.file_type == "envi":
-            pixels = envi_read_pixels(self.data,lines,columns,self.interleave)
-            if self.endianness != sys.byteorder:
-                pixels = pixels.byteswap()
-        self.close_data()
+        with self._data_ctx():
+            if self.file_type == "neon":
+                pixels = neon_read_pixels(self.data,lines,columns)
+            elif self.file_type == "envi":
+                pixels = envi_read_pixels(self.data,lines,columns,self.interleave)
 
         return pixels
 
-    def get_line(self,index):
+    def get_line(self,index, out = None):
         """
         Args:
             index (int): Zero-indexed line index.
+            out (numpy.ndarray, optional): Array (columns, bands) the line is
+                                           read into. Defaults to None.
 
         Returns:
             numpy.ndarray: Line array (columns, bands).
 
         """
 
-        self.load_data()
-        if self.file_type == "neon":
-            line = self.data[index,:,:]
-        elif self.file_type == "envi":
-            line = envi_read_line(self.data,index,self.interleave)
-            if self.endianness != sys.byteorder:
-                line = line.byteswap()
-        self.close_data()
+        with self._data_ctx():
+            if self.file_type == "neon":
+                line = neon_read(self.data,np.s_[index,:,:],out)
+            elif self.file_type == "envi":
+                line = envi_read_line(self.data,index,self.interleave,out)
 
         return line
 
-    def get_column(self,index):
+    def get_column(self,index, out = None):
         """
         Args:
             index (int): Zero-indexed column index.
+            out (numpy.ndarray, optional): Array (lines, bands) the column is
+                                           read into. Defaults to None.
 
         Returns:
             numpy.ndarray: Column array (lines, bands).
 
         """
 
-        self.load_data()
-        if self.file_type == "neon":
-            column = self.data[:,index,:]
-        elif self.file_type == "envi":
-            column = envi_read_column(self.data,index,self.interleave)
-            if self.endianness != sys.byteorder:
-                column = column.byteswap()
-        self.close_data()
+        with self._data_ctx():
+            if self.file_type == "neon":
+                column = neon_read(self.data,np.s_[:,index,:],out)
+            elif self.file_type == "envi":
+                column = envi_read_column(self.data,index,self.interleave,out)
 
         return column
 
-    def get_chunk(self,col_start,col_end,line_start,line_end):
+    def get_chunk(self,col_start,col_end,line_start,line_end, out = None):
         """
         Args:
             col_start (int): Chunk starting column.
             col_end (int): Noninclusive chunk ending column index.
             line_start (int): Chunk starting line.
             line_end (int): Noninclusive chunk ending line index.
+            out (numpy.ndarray, optional): Array (line_end-line_start,col_end-col_start,bands)
+                                           the chunk is read into. Defaults to None.
 
         Returns:
             numpy.ndarray: Chunk array (line_end-line_start,col_end-col_start,bands).
 
         """
 
-        self.load_data()
-        if self.file_type == "neon":
-            chunk = self.data[line_start:line_end,col_start:col_end,:]
-        elif self.file_type == "envi":
-            chunk =  envi_read_chunk(self.data,col_start,col_end,
-                                     line_start,line_end,self.interleave)
-            if self.endianness != sys.byteorder:
-                chunk = chunk.byteswap()
-        self.close_data()
+        with self._data_ctx():
+            if self.file_type == "neon":
+                chunk = neon_read_chunk(self.data,col_start,col_end,
+                                        line_start,line_end,out)
+            elif self.file_type == "envi":
+                chunk =  envi_read_chunk(self.data,col_start,col_end,
+                                         line_start,line_end,self.interleave,out)
 
         return chunk
 
 
-    def ndi(self,wave1= 850,wave2 = 660,mask = None):
+    def ndi(self,wave1= 850,wave2 = 660,mask = None,scale = None):
         """ Calculate normalized difference index.
             Defaults to NDVI. Assumes input wavelengths are in
             nanometers
@@ -322,15 +457,39 @@ class HyTools:
             wave1 (int,float): Wavelength of first band. Defaults to 850.
             wave2 (int,float): Wavelength of second band. Defaults to 660.
             mask (bool): Mask data
+            scale (int, optional): Return the index as int16 scaled to +/- scale,
+                                   at most 32767, ex: 10000. Integer data is
+                                   processed using integer math. Divide by
+                                   scale to convert to float, values outside
+                                   the int16 range are clipped. Defaults to None.
+
+        Raises:
+            ValueError: If scale is not in the range (0, 32767].
 
         Returns:
-            ndi numpy.ndarray:
+            ndi numpy.ndarray: Pixels where both bands sum to zero are set to zero.
 
         """
 
-        wave1 = self.get_wave(wave1)
-        wave2 = self.get_wave(wave2)
-        ndi = (wave1-wave2)/(wave1+wave2)
+        if (scale is not None) and not (0 < scale <= np.iinfo(np.int16).max):
+            raise ValueError("Scale must be in the range (0, 32767], got %s." % scale)
+
+        band1 = self.wave_to_band(wave1)
+        band2 = self.wave_to_band(wave2)
+        if (band1 is None) or (band2 is None):
+            return None
+
+        band1,band2 = self.get_bands([band1,band2])
+        if (scale is not None) and (band1.dtype.kind in 'iu'):
+            ndi = np.empty(band1.shape,dtype=np.int16)
+            ndi_int_kernel(band1,band2,ndi,scale)
+        else:
+            ndi = np.empty(band1.shape,
+                           dtype=np.result_type(band1.dtype,band2.dtype,np.float32))
+            ndi_kernel(band1,band2,ndi)
+            if scale is not None:
+                int16 = np.iinfo(np.int16)
+                ndi = np.clip(np.floor(ndi*scale),int16.min,int16.max).astype(np.int16)
 
         if mask:
             ndi = ndi[self.mask[mask]]
@@ -360,29 +519,46 @@ class HyTools:
         return function(self)
 
     def get_header(self):
-        """ Return header dictionary
+        """ Return header dictionary. The header is parsed once and cached,
+        a copy of the cached dictionary is returned.
 
         """
-        if self.file_type == "neon":
-            header_dict = envi_header_from_neon(self)
-        elif self.file_type == "envi":
-            header_file = os.path.splitext(self.file_name)[0] + ".hdr"
-            header_dict = parse_envi_header(header_file)
-        return header_dict
+        if self._header_cache is None:
+            if self.file_type == "neon":
+                self._header_cache = envi_header_from_neon(self)
+            elif self.file_type == "envi":
+                header_file = os.path.splitext(self.file_name)[0] + ".hdr"
+                self._header_cache = parse_envi_header(header_file)
+        return dict(self._header_cache)
 
 class Iterator:
     """Iterator class
     """
 
-    def __init__(self,hy_obj,by,chunk_size = None):
+    def __init__(self,hy_obj,by,chunk_size = None,prefetch = 0,reuse_buffer = False):
         """
         Args:
             hy_obj (Hytools object): Populated Hytools file object.
             by (str): Iterator slice dimension: "line", "column", "band"",chunk".
             chunk_size (tuple, optional): Chunk size. Defaults to None.
+            prefetch (int, optional): Number of slices read ahead in a background
+                                      thread. Defaults to 0, no prefetching.
+            reuse_buffer (bool, optional): Read slices into preallocated buffers
+                                           reused across read_next() calls.
+                                           Defaults to False.
 
         Iterator cannot be pickled when reading HDF files.
 
+        The data object of the HyTools object is opened by the first call to
+        read_next() and closed once the last slice is read, the iterator is
+        reset or the iterator is garbage collected.
+        When prefetching all reads are made from a single background thread,
+        the HyTools object should not be read from other threads until the
+        iterator is complete or reset.
+
+        When reusing buffers the array returned by read_next() is only valid
+        until the next call to read_next(), copy it to keep it.
+
         Returns:
             None.
 
@@ -395,56 +571,180 @@ class Iterator:
         self.current_band = -1
         self.complete = False
         self.hy_obj = hy_obj
+        self.prefetch = prefetch
+        self._reader,self._slices = self._schedule()
+        self._index = 0
+        self._buffers = []
+        if reuse_buffer:
+            self._buffers = self._allocate_buffers()
+        self._queue = None
+        self._thread = None
+        self._stop = None
+        self._stop_finalizer = None
+        self._release = None
+
+    def _load(self):
+        """Open the data object for the duration of the iteration, the
+        data object is also released if the iterator is garbage collected.
+        """
+        if self._release is None:
+            self.hy_obj.load_data()
+            self._release = weakref.finalize(self,self.hy_obj.close_data)
+
+    def _close(self):
+        """Release the data object opened by _load().
+        """
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+    def _schedule(self):
+        """Precompute the (line,column,band) position and reader arguments
+        of every slice.
+
+        Returns:
+            tuple: Reader method and list of (position, arguments) tuples.
 
-    def read_next(self):
-        """ Return next line/column/band/chunk.
         """
 
+        lines,columns = self.hy_obj.lines,self.hy_obj.columns
         if self.by == "line":
-            self.current_line +=1
-            if self.current_line == self.hy_obj.lines-1:
-                self.complete = True
-            subset = self.hy_obj.get_line(self.current_line)
+            reader = self.hy_obj.get_line
+            slices = [((line,-1,-1),(line,)) for line in range(lines)]
         elif self.by == "column":
-            self.current_column +=1
-            if self.current_column == self.hy_obj.columns-1:
-                self.complete = True
-            subset = self.hy_obj.get_column(self.current_column)
+            reader = self.hy_obj.get_column
+            slices = [((-1,column,-1),(column,)) for column in range(columns)]
         elif self.by == "band":
-            self.current_band +=1
-            if self.current_band == self.hy_obj.bands-1:
-                self.complete = True
-            subset = self.hy_obj.get_band(self.current_band)
-
+            reader = self.hy_obj.get_band
+            slices = [((-1,-1,band),(band,)) for band in range(self.hy_obj.bands)]
         elif self.by == "chunk":
-            if self.current_column == -1:
-                self.current_column +=1
-                self.current_line +=1
-            else:
-                self.current_column += self.chunk_size[1]
-            if self.current_column >= self.hy_obj.columns:
-                self.current_column = 0
-                self.current_line += self.chunk_size[0]
-
-            y_start = self.current_line
-            y_end = self.current_line + self.chunk_size[0]
-            if y_end >= self.hy_obj.lines:
-                y_end = self.hy_obj.lines
-            x_start = self.current_column
-            x_end = self.current_column + self.chunk_size[1]
-            if x_end >= self.hy_obj.columns:
-                x_end = self.hy_obj.columns
-
-            if (y_end == self.hy_obj.lines) and (x_end == self.hy_obj.columns):
-                self.complete = True
-
-            subset = self.hy_obj.get_chunk(x_start,x_end, y_start,y_end)
+            reader = self.hy_obj.get_chunk
+            chunk_lines,chunk_columns = self.chunk_size
+            slices = [((y_start,x_start,-1),
+                       (x_start,min(x_start+chunk_columns,columns),
+                        y_start,min(y_start+chunk_lines,lines)))
+                      for y_start in range(0,lines,chunk_lines)
+                      for x_start in range(0,columns,chunk_columns)]
+        else:
+            raise ValueError("Unrecognized iterator dimension '%s', expected "
+                             "'line', 'column', 'band' or 'chunk'." % self.by)
+        return reader,slices
+
+    def _allocate_buffers(self):
+        """Allocate slice buffers, when prefetching enough buffers are
+        allocated to hold the queued slices, the slice being read and the
+        slice last returned.
+
+        Returns:
+            list: List of numpy.ndarray slice buffers.
+
+        """
+
+        lines,columns,bands = self.hy_obj.lines,self.hy_obj.columns,self.hy_obj.bands
+        shape = {"line": (columns,bands),
+                 "column": (lines,bands),
+                 "band": (lines,columns)}.get(self.by)
+        if self.by == "chunk":
+            shape = (min(self.chunk_size[0],lines),min(self.chunk_size[1],columns),bands)
+        dtype = np.dtype(self.hy_obj.dtype).newbyteorder('=')
+        count = self.prefetch + 2 if self.prefetch > 0 else 1
+        return [np.empty(shape,dtype=dtype) for i in range(count)]
+
+    def _read_slice(self):
+        """Read the next slice in the schedule.
+
+        Returns:
+            tuple: (line,column,band) position, slice array and completion flag.
+
+        """
+
+        position,args = self._slices[self._index]
+        if self._buffers:
+            out = self._buffers[self._index % len(self._buffers)]
+            if self.by == "chunk":
+                x_start,x_end,y_start,y_end = args
+                out = out[:y_end-y_start,:x_end-x_start]
+            subset = self._reader(*args,out=out)
+        else:
+            subset = self._reader(*args)
+        self._index += 1
+        return position,subset,self._index == len(self._slices)
+
+    @staticmethod
+    def _prefetch(iterator_ref,slice_queue,stop):
+        """Read slices and queue them for read_next(), run in a background
+        thread. Exceptions are passed through the queue. Only a weak
+        reference to the iterator is held, the thread exits once the
+        iterator is garbage collected.
+        """
+        last = False
+        while not last and not stop.is_set():
+            iterator = iterator_ref()
+            if iterator is None:
+                break
+            try:
+                item = iterator._read_slice()
+                last = item[2]
+            except Exception as exc:
+                item = exc
+                last = True
+            del iterator
+            while not stop.is_set():
+                try:
+                    slice_queue.put(item,timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def _stop_prefetch(self):
+        """Stop and join the prefetch thread.
+        """
+        if self._thread is not None:
+            self._stop_finalizer()
+            self._thread.join()
+            self._thread = None
+            self._queue = None
+            self._stop = None
+            self._stop_finalizer = None
+
+    def read_next(self):
+        """ Return next line/column/band/chunk.
+        """
+
+        self._load()
+
+        if self.prefetch > 0:
+            if self._thread is None:
+                self._queue = queue.Queue(maxsize=self.prefetch)
+                self._stop = threading.Event()
+                # Stop the thread if the iterator is abandoned without reset()
+                self._stop_finalizer = weakref.finalize(self,self._stop.set)
+                self._thread = threading.Thread(target=self._prefetch,daemon=True,
+                                                args=(weakref.ref(self),self._queue,self._stop))
+                self._thread.start()
+            item = self._queue.get()
+            if isinstance(item,Exception):
+                self._stop_prefetch()
+                self._close()
+                raise item
+        else:
+            item = self._read_slice()
+
+        position,subset,self.complete = item
+        self.current_line,self.current_column,self.current_band = position
+
+        if self.complete:
+            self._stop_prefetch()
+            self._close()
         return subset
 
     def reset(self):
         """Reset counters.
         """
+        self._stop_prefetch()
+        self._close()
         self.current_column = -1
         self.current_line = -1
         self.current_band = -1
+        self._index = 0
         self.complete = False
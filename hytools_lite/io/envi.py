@@ -20,7 +20,6 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 Functions for reading and writing ENVI formatted binary files
 """
 import os
-import sys
 from collections import Counter
 import numpy as np
 
@@ -135,7 +134,7 @@ def open_envi(hy_obj,anc_path = {}, ext = False):
 
 
     if isinstance(header_dict['bbl'],np.ndarray):
-        hy_obj.bad_bands = np.array([x==1 for x in header_dict['bbl']])
+        hy_obj.bad_bands = np.array([x==0 for x in header_dict['bbl']])
     if header_dict["interleave"] == 'bip':
         hy_obj.shape = (hy_obj.lines, hy_obj.columns, hy_obj.bands)
     elif header_dict["interleave"] == 'bil':
@@ -154,12 +153,6 @@ def open_envi(hy_obj,anc_path = {}, ext = False):
         low_l = hy_obj.data[-1,0,0]
         low_r = hy_obj.data[-1,-1,0]
 
-        if hy_obj.endianness != sys.byteorder:
-            up_l = up_l.byteswap()
-            up_r = up_r.byteswap()
-            low_l = low_l.byteswap()
-            low_r = low_r.byteswap()
-
         counts = {v: k for k, v in Counter([up_l,up_r,low_l,low_r]).items()}
         hy_obj.no_data = counts[max(counts.keys())]
         hy_obj.close_data()
@@ -356,12 +349,13 @@ def envi_header_dict():
     return {key:None for (key,value) in field_dict.items()}
 
 
-def envi_read_line(data,index,interleave):
+def envi_read_line(data,index,interleave,out = None):
     """
     Args:
         data (numpy.memmap): Numpy memory-map.
         index (int): Zero-based line index.
         interleave (str): Data interleave type.
+        out (numpy.ndarray, optional): Array the line is copied into. Defaults to None.
 
     Returns:
         numpy.ndarray: Line array (columns, bands).
@@ -374,14 +368,19 @@ def envi_read_line(data,index,interleave):
         line = np.moveaxis(data[index,:,:],0,1)
     elif interleave == "bsq":
         line = np.moveaxis(data[:,index,:],0,1)
-    return line
+    # Copy to a native byte order array, views would keep the memory-map open
+    if out is None:
+        out = np.empty(line.shape,dtype=line.dtype.newbyteorder('='))
+    np.copyto(out,line)
+    return out
 
-def envi_read_column(data,index,interleave):
+def envi_read_column(data,index,interleave,out = None):
     """
     Args:
         data (numpy.memmap): Numpy memory-map.
         index (int): Zero-based column index.
         interleave (str): Data interleave type.
+        out (numpy.ndarray, optional): Array the column is copied into. Defaults to None.
 
     Returns:
         numpy.ndarray: Column array (lines,bands).
@@ -394,14 +393,19 @@ def envi_read_column(data,index,interleave):
         column = data[:,:,index]
     elif interleave == "bsq":
         column =  np.moveaxis(data[:,:,index],0,1)
-    return column
+    # Copy to a native byte order array, views would keep the memory-map open
+    if out is None:
+        out = np.empty(column.shape,dtype=column.dtype.newbyteorder('='))
+    np.copyto(out,column)
+    return out
 
-def envi_read_band(data,index,interleave):
+def envi_read_band(data,index,interleave,out = None):
     """
     Args:
         data (numpy.memmap): Numpy memory-map.
         index (int): Zero-based line index.
         interleave (str): Data interleave type.
+        out (numpy.ndarray, optional): Array the band is copied into. Defaults to None.
 
     Returns:
         numpy.ndarray: Band array (lines,columns).
@@ -414,7 +418,42 @@ def envi_read_band(data,index,interleave):
         band = data[:,index,:]
     elif interleave == "bsq":
         band = data[index,:,:]
-    return band
+    # Copy to a native byte order array, views would keep the memory-map open
+    if out is None:
+        out = np.empty(band.shape,dtype=band.dtype.newbyteorder('='))
+    np.copyto(out,band)
+    return out
+
+def envi_read_bands(data,indices,interleave,out = None):
+    """Read multiple bands, each line is read once for all bands.
+
+    Args:
+        data (numpy.memmap): Numpy memory-map.
+        indices (list): List of zero-based band indices.
+        interleave (str): Data interleave type.
+        out (numpy.ndarray, optional): Array the bands are copied into. Defaults to None.
+
+    Returns:
+        numpy.ndarray: Bands array (bands,lines,columns).
+
+    """
+
+    indices = np.asarray(indices,dtype=int)
+    unique,inverse = np.unique(indices,return_inverse=True)
+
+    if interleave == "bip":
+        bands = np.moveaxis(data[:,:,unique],-1,0)
+    elif interleave == "bil":
+        bands = np.moveaxis(data[:,unique,:],1,0)
+    elif interleave == "bsq":
+        bands = data[unique,:,:]
+    # Restore requested band order
+    if not np.array_equal(unique,indices):
+        bands = bands[inverse]
+    if out is None:
+        return bands.astype(bands.dtype.newbyteorder('='),copy=False)
+    np.copyto(out,bands)
+    return out
 
 def envi_read_pixels(data,lines,columns,interleave):
     """
@@ -433,11 +472,11 @@ def envi_read_pixels(data,lines,columns,interleave):
     elif interleave == "bil":
         pixels = data[lines,:,columns]
     elif interleave == "bsq":
-        pixels = data[:,lines,columns]
-    return pixels
+        pixels = np.moveaxis(data[:,lines,columns],0,1)
+    return pixels.astype(pixels.dtype.newbyteorder('='),copy=False)
 
 
-def envi_read_chunk(data,col_start,col_end,line_start,line_end,interleave):
+def envi_read_chunk(data,col_start,col_end,line_start,line_end,interleave,out = None):
     """
     Args:
         data (numpy.memmap): Numpy memory-map.
@@ -446,6 +485,7 @@ def envi_read_chunk(data,col_start,col_end,line_start,line_end,interleave):
         line_start (int): Zero -ased top line index.
         line_end (int): Non-inclusive zero-based bottom line index.
         interleave (str): Data interleave type.
+        out (numpy.ndarray, optional): Array the chunk is copied into. Defaults to None.
 
     Returns:
         numpy.ndarray: Chunk array (line_end-line_start,col_end-col_start,bands).
@@ -458,7 +498,11 @@ def envi_read_chunk(data,col_start,col_end,line_start,line_end,interleave):
         chunk = np.moveaxis(data[line_start:line_end,:,col_start:col_end],-1,-2)
     elif interleave == "bsq":
         chunk = np.moveaxis(data[:,line_start:line_end,col_start:col_end],0,-1)
-    return chunk
+    # Copy to a native byte order array, views would keep the memory-map open
+    if out is None:
+        out = np.empty(chunk.shape,dtype=chunk.dtype.newbyteorder('='))
+    np.copyto(out,chunk)
+    return out
 
 
 
@@ -19,8 +19,10 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 NEON AOP HDF opener
 """
+import os
 import h5py
 import numpy as np
+from .neon_b2nd import HDF5PLUGIN,b2nd_file_name,b2nd_read_chunk
 
 
 def open_neon(hy_obj, no_data = -9999):
@@ -35,7 +37,14 @@ def open_neon(hy_obj, no_data = -9999):
 
     """
 
-    hdf_obj = h5py.File(hy_obj.file_name,'r')
+    # Read data from the Blosc2 mirror when available and up to date
+    hy_obj.data_file = hy_obj.file_name
+    mirror = b2nd_file_name(hy_obj.file_name)
+    if (HDF5PLUGIN and os.path.isfile(mirror) and
+            os.path.getmtime(mirror) > os.path.getmtime(hy_obj.file_name)):
+        hy_obj.data_file = mirror
+
+    hdf_obj = h5py.File(hy_obj.data_file,'r')
     hy_obj.base_key = list(hdf_obj.keys())[0]
     metadata = hdf_obj[hy_obj.base_key]["Reflectance"]["Metadata"]
     data = hdf_obj[hy_obj.base_key]["Reflectance"]["Reflectance_Data"]
@@ -49,6 +58,7 @@ def open_neon(hy_obj, no_data = -9999):
     hy_obj.lines = data.shape[0]
     hy_obj.columns = data.shape[1]
     hy_obj.bands = data.shape[2]
+    hy_obj.dtype = data.dtype
     hy_obj.bad_bands = np.array([False for band in range(hy_obj.bands)])
     hy_obj.no_data = no_data
     hy_obj.anc_path = {'path_length': ['Ancillary_Imagery','Path_Length'],
@@ -67,5 +77,127 @@ def open_neon(hy_obj, no_data = -9999):
                         'visibility_index': ['Ancillary_Imagery','Visibility_Index_Map'],
                         'haze_water_cloud': ['Ancillary_Imagery','Haze_Water_Cloud_Map'],
                         'water_vapor': ['Ancillary_Imagery','Water_Vapor_Column']}
+    hdf_obj.close()
 
     return hy_obj
+
+
+def neon_read_pixels(data,lines,columns):
+    """Read pixels from a NEON reflectance dataset. Pixels are grouped by
+    HDF chunk so that each chunk is read and decompressed only once.
+
+    Args:
+        data (h5py.Dataset): NEON reflectance dataset.
+        lines (list): List of zero-indexed line indices.
+        columns (list): List of zero-indexed column indices.
+
+    Returns:
+        numpy.ndarray: Pixel array (pixels,bands).
+
+    """
+
+    lines = np.asarray(lines,dtype=int)
+    columns = np.asarray(columns,dtype=int)
+    pixels = np.empty((lines.size,data.shape[2]),dtype=data.dtype)
+    if lines.size == 0:
+        return pixels
+
+    # Wrap negative indices, as numpy indexing
+    for indices,size in ((lines,data.shape[0]),(columns,data.shape[1])):
+        if ((indices < -size) | (indices >= size)).any():
+            raise IndexError("Pixel index out of bounds for axis with size %s." % size)
+    lines = lines % data.shape[0]
+    columns = columns % data.shape[1]
+
+    # Unchunked datasets are grouped by line
+    if data.chunks:
+        chunk_lines,chunk_columns = data.chunks[:2]
+    else:
+        chunk_lines,chunk_columns = 1,data.shape[1]
+
+    chunk_ids = (lines//chunk_lines)*data.shape[1] + columns//chunk_columns
+    order = np.argsort(chunk_ids,kind='stable')
+    starts = np.flatnonzero(np.diff(chunk_ids[order])) + 1
+
+    for group in np.split(order,starts):
+        group_lines = lines[group]
+        group_columns = columns[group]
+        line_start,col_start = group_lines.min(),group_columns.min()
+        block = data[line_start:group_lines.max()+1,col_start:group_columns.max()+1,:]
+        pixels[group] = block[group_lines-line_start,group_columns-col_start]
+    return pixels
+
+
+def neon_read(data,selection,out = None):
+    """Read a selection from a NEON reflectance dataset.
+
+    Args:
+        data (h5py.Dataset): NEON reflectance dataset.
+        selection (tuple): Dataset selection, ex: numpy.s_[:,:,0].
+        out (numpy.ndarray, optional): Array the selection is read into. Defaults to None.
+
+    Returns:
+        numpy.ndarray: Selection array.
+
+    """
+
+    if out is None:
+        return data[selection]
+    # Read directly into contiguous buffers, skipping the intermediate array
+    if out.flags.c_contiguous:
+        data.read_direct(out,source_sel=selection)
+    else:
+        np.copyto(out,data[selection])
+    return out
+
+
+def neon_read_bands(data,indices,out = None):
+    """Read multiple bands from a NEON reflectance dataset in a single
+    selection.
+
+    Args:
+        data (h5py.Dataset): NEON reflectance dataset.
+        indices (list): List of zero-based band indices.
+        out (numpy.ndarray, optional): Array the bands are copied into. Defaults to None.
+
+    Returns:
+        numpy.ndarray: Bands array (bands,lines,columns).
+
+    """
+
+    indices = np.asarray(indices,dtype=int)
+    # h5py requires increasing indices
+    unique,inverse = np.unique(indices,return_inverse=True)
+    bands = np.moveaxis(data[:,:,list(unique)],-1,0)
+    if not np.array_equal(unique,indices):
+        bands = bands[inverse]
+    if out is not None:
+        np.copyto(out,bands)
+        bands = out
+    return bands
+
+
+def neon_read_chunk(data,col_start,col_end,line_start,line_end,out = None):
+    """Read a chunk from a NEON reflectance dataset, stored Blosc2 chunks
+    are decompressed directly when the chunk matches a stored chunk.
+
+    Args:
+        data (h5py.Dataset): NEON reflectance dataset.
+        col_start (int):  Zero-based left column index.
+        col_end (int): Non-inclusive zero-based right column index.
+        line_start (int): Zero-based top line index.
+        line_end (int): Non-inclusive zero-based bottom line index.
+        out (numpy.ndarray, optional): Array the chunk is read into. Defaults to None.
+
+    Returns:
+        numpy.ndarray: Chunk array (line_end-line_start,col_end-col_start,bands).
+
+    """
+
+    chunk = b2nd_read_chunk(data,col_start,col_end,line_start,line_end)
+    if chunk is None:
+        return neon_read(data,np.s_[line_start:line_end,col_start:col_end,:],out)
+    if out is not None:
+        np.copyto(out,chunk)
+        chunk = out
+    return chunk
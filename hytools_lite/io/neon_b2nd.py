@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+HyTools-lite
+Copyright (C) 2021 University of Wisconsin
+
+Authors: Adam Chlus
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, version 3 of the License.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Blosc2 compressed mirrors of NEON AOP HDF files
+"""
+import os
+import h5py
+import numpy as np
+
+try:
+    import hdf5plugin
+    HDF5PLUGIN = True
+except ImportError:
+    HDF5PLUGIN = False
+
+try:
+    import blosc2
+    BLOSC2 = True
+except ImportError:
+    BLOSC2 = False
+
+# HDF5 registered filter id of Blosc2
+BLOSC2_FILTER = 32026
+
+
+def b2nd_file_name(file_name):
+    """
+    Args:
+        file_name (str): Pathname of NEON HDF file.
+
+    Returns:
+        str: Pathname of the Blosc2 mirror of the NEON file.
+
+    """
+    return os.path.splitext(file_name)[0] + ".b2nd.h5"
+
+
+def _copy_group(src,dst,skip):
+    """Recursively copy HDF group contents and attributes, skipping one dataset.
+    """
+    for key,value in src.attrs.items():
+        dst.attrs[key] = value
+    for name,item in src.items():
+        if item.name == skip:
+            continue
+        if isinstance(item,h5py.Group):
+            _copy_group(item,dst.create_group(name),skip)
+        else:
+            src.copy(item,dst,name=name)
+
+
+def neon_to_b2nd(file_name,output_name = None,chunk_size = (64,64),clevel = 3):
+    """Write a copy of a NEON HDF file with the reflectance data recompressed
+    using Blosc2, chunked for band-wise access. When present and newer
+    than the original file the mirror is read in place of the original by
+    open_neon.
+
+    Args:
+        file_name (str): Pathname of input NEON HDF file.
+        output_name (str, optional): Pathname of output HDF file.
+                                     Defaults to b2nd_file_name(file_name).
+        chunk_size (tuple, optional): Two dimensional chunk size (Y,X), chunks
+                                      span all bands. Defaults to (64,64).
+        clevel (int, optional): Compression level. Defaults to 3.
+
+    Returns:
+        str: Pathname of output HDF file.
+
+    """
+
+    if not HDF5PLUGIN:
+        raise ImportError("hdf5plugin is required to write Blosc2 compressed files.")
+    if output_name is None:
+        output_name = b2nd_file_name(file_name)
+
+    with h5py.File(file_name,'r') as src, h5py.File(output_name,'w') as dst:
+        base_key = list(src.keys())[0]
+        src_data = src[base_key]["Reflectance"]["Reflectance_Data"]
+        _copy_group(src,dst,src_data.name)
+
+        lines,columns,bands = src_data.shape
+        chunks = (min(chunk_size[0],lines),min(chunk_size[1],columns),bands)
+        dst_data = dst.create_dataset(src_data.name,shape = src_data.shape,
+                                      dtype = src_data.dtype,chunks = chunks,
+                                      **hdf5plugin.Blosc2(cname='zstd',clevel=clevel,
+                                                          filters=hdf5plugin.Blosc2.BITSHUFFLE))
+        for key,value in src_data.attrs.items():
+            dst_data.attrs[key] = value
+        # Copy one row of chunks at a time
+        for line in range(0,lines,chunks[0]):
+            dst_data[line:line+chunks[0]] = src_data[line:line+chunks[0]]
+
+    return output_name
+
+
+def b2nd_read_chunk(data,col_start,col_end,line_start,line_end):
+    """Read a chunk by decompressing the stored Blosc2 chunk directly,
+    bypassing the HDF filter pipeline. Only applies when the requested
+    chunk matches a stored chunk.
+
+    Args:
+        data (h5py.Dataset): NEON reflectance dataset.
+        col_start (int): Chunk starting column.
+        col_end (int): Noninclusive chunk ending column index.
+        line_start (int): Chunk starting line.
+        line_end (int): Noninclusive chunk ending line index.
+
+    Returns:
+        numpy.ndarray: Chunk array (line_end-line_start,col_end-col_start,bands),
+                       None if the chunk cannot be read directly.
+
+    """
+
+    if not BLOSC2 or data.chunks is None:
+        return None
+
+    lines,columns,bands = data.shape
+    chunk_lines,chunk_columns,chunk_bands = data.chunks
+    if ((chunk_bands != bands) or (line_start % chunk_lines) or (col_start % chunk_columns) or
+            (line_end != min(line_start+chunk_lines,lines)) or
+            (col_end != min(col_start+chunk_columns,columns))):
+        return None
+
+    dcpl = data.id.get_create_plist()
+    if (dcpl.get_nfilters() != 1) or (dcpl.get_filter(0)[0] != BLOSC2_FILTER):
+        return None
+
+    filter_mask,buffer = data.id.read_direct_chunk((line_start,col_start,0))
+    if filter_mask:
+        return None
+    # Stored chunks are padded to the full chunk size at image edges
+    chunk = blosc2.ndarray_from_cframe(buffer)[...].view(data.dtype)
+    return chunk[:line_end-line_start,:col_end-col_start]
@@ -9,5 +9,8 @@ setup(
     url='https://github.com/EnSpec/hytools-lite',
     author = 'Adam Chlus',
     packages=find_packages(),
+    python_requires='>=3.8',
     install_requires=['h5py',
-                      'numpy'])
+                      'numpy'],
+    extras_require={'fast': ['numba>=0.56'],
+                    'b2nd': ['hdf5plugin','blosc2']})
@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pytest
+from hytools_lite import HyTools
+from hytools_lite.io.envi import envi_header_dict, parse_envi_header, write_envi_header
+
+
+def write_envi(file_name, data, data_type):
+    lines, columns, bands = data.shape
+    data.tofile(file_name)
+    header = envi_header_dict()
+    header.update({"samples": columns, "lines": lines, "bands": bands,
+                   "interleave": "bip", "data type": data_type, "byte order": 0,
+                   "wavelength": np.array([500., 600., 700.]),
+                   "wavelength units": "nanometers", "data ignore value": -9999})
+    write_envi_header(file_name, header)
+
+
+@pytest.fixture
+def envi_file(tmp_path):
+    data = np.arange(5*4*3, dtype=np.int16).reshape(5, 4, 3)
+    file_name = str(tmp_path / "image")
+    write_envi(file_name, data, 2)
+    return file_name, data
+
+
+def test_failed_load_does_not_leak_open_count(envi_file):
+    file_name, data = envi_file
+    hy_obj = HyTools()
+    hy_obj.read_file(file_name, "envi")
+
+    os.rename(file_name, file_name + ".moved")
+    with pytest.raises(FileNotFoundError):
+        hy_obj.get_band(0)
+    assert hy_obj._open_count == 0
+
+    os.rename(file_name + ".moved", file_name)
+    assert np.array_equal(hy_obj.get_band(1), data[:, :, 1])
+    assert hy_obj._open_count == 0
+
+
+@pytest.mark.parametrize("dtype,data_type", [(np.int16, 2), (np.float32, 4)])
+def test_scaled_ndi_clips_to_int16(tmp_path, dtype, data_type):
+    data = np.ones((2, 2, 3), dtype=dtype)*1000
+    # No data next to a valid pixel gives an index far outside [-1,1]
+    data[0, 0, 0], data[0, 0, 2] = 9990, -9999
+    file_name = str(tmp_path / "image")
+    write_envi(file_name, data, data_type)
+    hy_obj = HyTools()
+    hy_obj.read_file(file_name, "envi")
+
+    ndi = hy_obj.ndi(500, 700, scale=10000)
+    assert ndi.dtype == np.int16
+    assert ndi[0, 0] == np.iinfo(np.int16).min
+    assert (ndi[1] == 0).all()
+
+
+def test_bbl_zero_marks_bad_band(tmp_path):
+    file_name = str(tmp_path / "image")
+    write_envi(file_name, np.ones((2, 2, 3), dtype=np.int16), 2)
+    header = parse_envi_header(file_name + ".hdr")
+    header["bbl"] = np.array([1., 0., 1.])
+    write_envi_header(file_name, header)
+    hy_obj = HyTools()
+    hy_obj.read_file(file_name, "envi")
+    assert hy_obj.bad_bands.tolist() == [False, True, False]
+
+
+def test_prefetch_error_closes_data(envi_file, monkeypatch):
+    file_name, _ = envi_file
+    hy_obj = HyTools()
+    hy_obj.read_file(file_name, "envi")
+    iterator = hy_obj.iterate(by="line", prefetch=2)
+
+    def fail():
+        raise OSError("read failed")
+    monkeypatch.setattr(iterator, "_read_slice", fail)
+
+    with pytest.raises(OSError):
+        iterator.read_next()
+    assert hy_obj._open_count == 0
+    assert hy_obj.data is None
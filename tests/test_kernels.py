@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from hytools_lite import _kernels
+
+
+@pytest.mark.skipif(not _kernels.NUMBA, reason="numba not installed")
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.int16, np.float32])
+def test_ndi_kernel_numba_matches_numpy(dtype, monkeypatch):
+    rng = np.random.default_rng(0)
+    band1 = rng.integers(0, 250, 1000).astype(dtype)
+    band2 = rng.integers(0, 250, 1000).astype(dtype)
+    band1[:3] = 0
+    band2[:3] = 0
+
+    numba_out = _kernels.ndi_kernel(band1, band2, np.empty(1000, np.float32))
+    monkeypatch.setattr(_kernels, "NUMBA", False)
+    numpy_out = _kernels.ndi_kernel(band1, band2, np.empty(1000, np.float32))
+
+    assert np.allclose(numba_out, numpy_out, atol=1e-6)
+    assert np.abs(numba_out).max() <= 1
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16, np.int16])
+def test_ndi_int_kernel_numba_matches_numpy(dtype, monkeypatch):
+    rng = np.random.default_rng(0)
+    info = np.iinfo(dtype)
+    low = max(info.min, -10000)
+    high = min(info.max, 10000)
+    band1 = rng.integers(low, high, 1000).astype(dtype)
+    band2 = rng.integers(low, high, 1000).astype(dtype)
+    band1[:3] = 0
+    band2[:3] = 0
+    if info.min < 0:
+        # No data next to a valid pixel, true value is far outside int16
+        band1[3], band2[3] = -9999, 9990
+
+    numpy_out = np.empty(1000, np.int16)
+    monkeypatch.setattr(_kernels, "NUMBA", False)
+    _kernels.ndi_int_kernel(band1, band2, numpy_out, 10000)
+    monkeypatch.undo()
+
+    total = band1.astype(np.int64) + band2.astype(np.int64)
+    diff = (band1.astype(np.int64) - band2.astype(np.int64))*10000
+    expected = np.where(total != 0, diff//np.where(total != 0, total, 1), 0)
+    assert np.array_equal(numpy_out, np.clip(expected, -32768, 32767))
+    if info.min < 0:
+        assert numpy_out[3] == 32767
+
+    if _kernels.NUMBA:
+        numba_out = np.empty(1000, np.int16)
+        _kernels.ndi_int_kernel(band1, band2, numba_out, 10000)
+        assert np.array_equal(numba_out, numpy_out)
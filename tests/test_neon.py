@@ -0,0 +1,29 @@
+import numpy as np
+import h5py
+import pytest
+from hytools_lite.io.neon import neon_read_pixels
+
+
+@pytest.fixture
+def reflectance(tmp_path):
+    data = np.arange(13*11*4, dtype=np.int16).reshape(13, 11, 4)
+    with h5py.File(tmp_path / "neon.h5", "w") as hdf_obj:
+        hdf_obj.create_dataset("data", data=data, chunks=(4, 4, 4))
+    hdf_obj = h5py.File(tmp_path / "neon.h5", "r")
+    yield hdf_obj["data"], data
+    hdf_obj.close()
+
+
+def test_read_pixels_matches_numpy(reflectance):
+    dataset, data = reflectance
+    lines = [0, 12, 5, -1, -13, 3, 3]
+    columns = [0, 10, 6, -1, -11, 9, 2]
+    assert np.array_equal(neon_read_pixels(dataset, lines, columns), data[lines, columns])
+
+
+def test_read_pixels_out_of_bounds(reflectance):
+    dataset, _ = reflectance
+    with pytest.raises(IndexError):
+        neon_read_pixels(dataset, [13], [0])
+    with pytest.raises(IndexError):
+        neon_read_pixels(dataset, [0], [-12])